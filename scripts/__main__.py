@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the gallery scripts.
+
+Usage:
+    python3 -m scripts extract-heic photos/*.HEIC [--output-dir ./videos]
+    python3 -m scripts import intake/* --labubu --custom
+    python3 -m scripts extract-heic @files.txt
+
+Each command takes the same arguments as its script, and "@file" reads
+further arguments from a file, one per line, so a whole batch runs in one
+Python process instead of one per file.
+"""
+
+import os
+import sys
+import argparse
+import importlib
+
+# The scripts import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "extract-heic": ("extract_heic_video", "Extract MOV video from HEIC Live Photos"),
+    "import": ("batch_heic_importer", "Import folders of paired HEIC and MOV files into the gallery"),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python3 -m scripts",
+        description="HEIC Live Photo gallery tools",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Commands:\n" + "\n".join(f"  {name:<14}{help_text}" for name, (_, help_text) in COMMANDS.items())
+    )
+    parser.add_argument("command", choices=COMMANDS, help="Command to run")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the command")
+
+    args = parser.parse_args(argv)
+
+    # Only import the command that is actually run
+    module = importlib.import_module(COMMANDS[args.command][0])
+    module.main(args.args, prog=f"{parser.prog} {args.command}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Long-lived exiftool process shared by the HEIC gallery scripts.
+
+exiftool's -stay_open mode keeps one process running and reads its command
+lines from an argument file, here stdin (-@ -):
+
+    - Every line written to stdin is a single argument and needs no shell
+      quoting, but argfile lines aren't taken entirely literally: a leading
+      "-" starts an option, a line starting with "#" is a comment and
+      leading whitespace is removed. path_arg() prefixes such paths with
+      "./" so they reach exiftool intact. A line can't hold a newline, so
+      paths containing one are rejected.
+    - A command ends with "-executeN". Once it has run, exiftool writes
+      "{readyN}" on stdout, which is how we know where the output ends.
+      Numbering each command means output from a previous command can never
+      be mistaken for the end of the current one.
+    - stdout is read as raw bytes, since -b output (embedded videos,
+      thumbnails) is binary and may contain anything but the marker.
+    - Sending "-stay_open False" makes exiftool exit.
+"""
+
+import os
+import subprocess
+
+from batch_heic_common import parse_json, path_arg
+
+class ExifToolSession:
+    """Long-lived exiftool process driven through its -stay_open protocol"""
+
+    def __init__(self):
+        self.process = None
+        self.command_count = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def start(self):
+        """Launch the exiftool process"""
+        self.process = subprocess.Popen(
+            ['exiftool', '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Ask exiftool to exit and wait for it"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write(b"-stay_open\nFalse\n")
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+        self.process = None
+
+    def kill(self):
+        """Stop an exiftool process that can no longer be talked to"""
+        if self.process is None:
+            return
+        self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.process = None
+
+    def is_running(self):
+        """Check whether the session can take another command"""
+        return self.process is not None and self.process.poll() is None
+
+    def execute(self, *args, output=None):
+        """Run one exiftool command and return its output as bytes
+
+        If output is a binary file object the result is streamed into it
+        instead of being collected in memory. If the command fails part way
+        (exiftool died, a broken pipe, a failed write to output) the process
+        is killed, since its output can no longer be matched up with our
+        commands; call start() to get a new one.
+        """
+        if self.process is None:
+            raise RuntimeError("exiftool is not running")
+
+        try:
+            return self.run_command(args, output)
+        except BaseException:
+            self.kill()
+            raise
+
+    def run_command(self, args, output):
+        """Send one command and read its output up to the ready marker"""
+        self.command_count += 1
+        sentinel = f"{{ready{self.command_count}}}".encode()
+
+        # One argument per line, terminated by a numbered -execute
+        command = [str(arg) for arg in args] + [f"-execute{self.command_count}"]
+        self.process.stdin.write(("\n".join(command) + "\n").encode())
+        self.process.stdin.flush()
+
+        fd = self.process.stdout.fileno()
+        buffer = bytearray()
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise RuntimeError("exiftool exited unexpectedly")
+
+            search_from = max(0, len(buffer) - len(sentinel))
+            buffer += chunk
+            end = buffer.find(sentinel, search_from)
+            if end != -1:
+                del buffer[end:]
+                break
+
+            # Hand finished data to the output file, keeping enough of the
+            # tail to spot a sentinel split across reads
+            if output is not None and len(buffer) > len(sentinel):
+                output.write(buffer[:-len(sentinel)])
+                del buffer[:-len(sentinel)]
+
+        if output is not None:
+            output.write(buffer)
+            return b""
+        return bytes(buffer)
+
+    def extract_binary(self, path, tag, output=None):
+        """Get the raw value of a binary tag such as EmbeddedVideoFile
+
+        Returns the bytes, or streams them into output if it is given.
+        An empty result means the file has no such tag.
+        """
+        return self.execute('-b', f'-{tag}', path_arg(path), output=output)
+
+    def get_metadata(self, paths, *tags):
+        """Read numeric metadata for many files in one command
+
+        Returns one dict per file exiftool could read, each holding
+        SourceFile plus whichever of the requested tags it found.
+        """
+        if not paths:
+            return []
+
+        output = self.execute('-json', '-n', *(f'-{tag}' for tag in tags), *map(path_arg, paths))
+        return parse_json(output) if output.strip() else []
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the HEIC gallery scripts.
+
+Holds the dependency check, file copy/probe helpers and gallery-config.json
+handling used by both batch_heic_importer.py and extract_heic_video.py.
+"""
+
+import os
+import errno
+import argparse
+import json
+import atexit
+import threading
+import fcntl
+import shutil
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+import re
+
+try:
+    import orjson  # Optional, much faster for large gallery configs
+except ImportError:
+    orjson = None
+
+try:
+    import av  # Optional, reads video durations without starting ffprobe
+except ImportError:
+    av = None
+
+def parse_json(data):
+    """Parse JSON text or bytes, using orjson when it is installed"""
+    return orjson.loads(data) if orjson else json.loads(data)
+
+# Patterns used by sanitize_filename, compiled once per run
+NON_ALNUM_PATTERN = re.compile(r'[^a-z0-9_]')
+MULTI_UNDERSCORE_PATTERN = re.compile(r'_+')
+
+# ISOBMFF brands used by HEIC/HEIF stills and sequences
+HEIC_BRANDS = {b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1'}
+
+def is_heic_file(file_path):
+    """Check the ftyp box to see whether a file really is HEIC/HEIF"""
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    
+    return header[4:8] == b'ftyp' and header[8:12] in HEIC_BRANDS
+
+def check_dependencies():
+    """Check if required tools are installed"""
+    tools = ['exiftool', 'ffmpeg']
+    
+    # A PATH lookup is enough here and avoids starting each tool
+    missing = [tool for tool in tools if shutil.which(tool) is None]
+    
+    if missing:
+        print(f"❌ Missing required tools: {', '.join(missing)}")
+        print("\nTo install missing tools:")
+        for tool in missing:
+            print(f"   brew install {tool}")
+        return False
+    
+    return True
+
+def positive_int(value):
+    """argparse type for counts such as --jobs that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def is_same_file(src, dst, src_stat=None):
+    """Check whether dst already holds a copy of src (same size and mtime)"""
+    try:
+        src_stat = src_stat or os.stat(src)
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    
+    return (src_stat.st_size, src_stat.st_mtime_ns) == (dst_stat.st_size, dst_stat.st_mtime_ns)
+
+# Errors from os.link that mean "can't link here", so copying is the answer
+LINK_FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK}
+
+def link_or_copy(src, dst):
+    """Hard link src to dst when possible, falling back to a full copy"""
+    # Build the new file under a name only this thread uses and swap it in,
+    # so an existing dst (which may itself be a hard link to some other
+    # original) is replaced rather than written through
+    tmp_path = f"{os.fspath(dst)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        
+        try:
+            os.link(src, tmp_path)
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+            # Different filesystem or links not supported. copyfile uses the
+            # kernel fast path (sendfile/fcopyfile); only the mtime is carried
+            # over, which is all is_same_file needs
+            shutil.copyfile(src, tmp_path)
+            src_stat = os.stat(src)
+            os.utime(tmp_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        
+        os.replace(tmp_path, dst)
+    finally:
+        # Also covers dst already being a link to src, where rename is a no-op
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+
+def path_arg(path):
+    """Turn a file path into a single exiftool argument line"""
+    path = str(path)
+    if "\n" in path:
+        raise ValueError(f"exiftool can't be given a path containing a newline: {path!r}")
+    # In an argfile a leading "-" starts an option, a leading "#" a comment
+    # and leading whitespace is stripped, so anchor such names with "./"
+    return f"./{path}" if path[:1] in ("-", "#") or path[:1].isspace() else path
+
+def batch_probe(paths):
+    """Get duration and size for many files with a single exiftool run"""
+    # exiftool reports each file under the argument it was given, so keep
+    # the way back to the caller's path
+    paths_by_arg = {}
+    for path in paths:
+        try:
+            paths_by_arg[path_arg(path)] = str(path)
+        except ValueError:
+            continue  # Left unprobed; callers fall back to stat and ffprobe
+    
+    if not paths_by_arg:
+        return {}
+    
+    try:
+        # Paths go through an argfile on stdin so large batches don't hit ARG_MAX
+        result = subprocess.run([
+            'exiftool', '-json', '-n',
+            '-Duration', '-FileSize',
+            '-@', '-'
+        ], input='\n'.join(paths_by_arg).encode(), capture_output=True)
+        
+        # exiftool exits non-zero if any single file fails but still reports the rest
+        entries = parse_json(result.stdout) if result.stdout.strip() else []
+    except (OSError, ValueError):
+        return {}
+    
+    metadata = {}
+    for entry in entries:
+        source_file = entry["SourceFile"]
+        metadata[paths_by_arg.get(source_file, source_file)] = {
+            "duration": entry.get("Duration"),
+            "size": entry.get("FileSize")
+        }
+    
+    return metadata
+
+# Probed durations survive between runs, keyed by path, mtime and size
+DURATION_CACHE_PATH = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "livephotos" / "ffprobe.json"
+duration_cache_lock = threading.Lock()
+# Set when a new duration is probed, so an unchanged cache isn't rewritten
+duration_cache_dirty = False
+duration_cache = None
+
+def load_duration_cache():
+    """Load the persistent ffprobe duration cache (once per process)"""
+    global duration_cache
+    
+    # Importer worker threads get here at the same time; the lock makes sure
+    # only one of them loads the file, so they all share a single dict
+    with duration_cache_lock:
+        if duration_cache is None:
+            try:
+                duration_cache = parse_json(DURATION_CACHE_PATH.read_bytes())
+            except (OSError, ValueError):
+                duration_cache = {}
+            atexit.register(save_duration_cache)
+        return duration_cache
+
+def save_duration_cache():
+    """Write the ffprobe duration cache back to disk"""
+    if not duration_cache_dirty:
+        return
+    
+    cache = load_duration_cache()
+    with duration_cache_lock:
+        # Only keep entries that still match a file on disk, so the cache
+        # holds one entry per live video instead of every version ever seen
+        live_cache = {}
+        for cache_key, duration in cache.items():
+            try:
+                path, mtime_ns, size = cache_key.rsplit('|', 2)
+                stat = os.stat(path)
+            except (ValueError, OSError):
+                continue
+            if (str(stat.st_mtime_ns), str(stat.st_size)) == (mtime_ns, size):
+                live_cache[cache_key] = duration
+    
+    try:
+        DURATION_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        # Per-process temp name, as several importer runs may save at once
+        tmp_path = DURATION_CACHE_PATH.with_name(f"{DURATION_CACHE_PATH.stem}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(orjson.dumps(live_cache) if orjson else json.dumps(live_cache).encode())
+        os.replace(tmp_path, DURATION_CACHE_PATH)
+    except OSError:
+        pass
+
+def get_video_duration(video_path, metadata=None):
+    """Get video duration in seconds"""
+    global duration_cache_dirty
+    
+    if metadata and isinstance(metadata.get("duration"), (int, float)):
+        return float(metadata["duration"])
+    
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return 1.0
+    
+    cache = load_duration_cache()
+    cache_key = f"{os.path.abspath(video_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    if cache_key in cache:
+        return cache[cache_key]
+    
+    try:
+        if av is not None:
+            # Read the container in-process instead of starting ffprobe
+            with av.open(str(video_path)) as container:
+                duration = container.duration / av.time_base if container.duration else 1.0
+        else:
+            result = subprocess.run([
+                'ffprobe', '-v', 'quiet',
+                '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                str(video_path)
+            ], capture_output=True, text=True, check=True)
+            
+            duration_str = result.stdout.strip()
+            if duration_str and duration_str != 'N/A':
+                duration = float(duration_str)
+            else:
+                duration = 1.0  # Default for static images
+    except:
+        return 1.0
+    
+    with duration_cache_lock:
+        cache[cache_key] = duration
+        duration_cache_dirty = True
+    return duration
+
+SIZE_UNITS = ['KB', 'MB', 'GB', 'TB']
+
+def size_unit(size_bytes):
+    """Pick the divisor and unit name for a size of at least 1 KB"""
+    # Each unit is 10 more bits, so the bit length picks it without a loop
+    index = min((int(size_bytes).bit_length() - 1) // 10, len(SIZE_UNITS))
+    return 1 << (index * 10), SIZE_UNITS[index - 1]
+
+def format_file_size(size_bytes):
+    """Format a byte count into a human readable string"""
+    if size_bytes < 1024:
+        return f"{int(size_bytes)} bytes"
+    divisor, unit = size_unit(size_bytes)
+    return f"{size_bytes / divisor:.1f} {unit}"
+
+def format_bytes(bytes_val):
+    """Format bytes into human readable string"""
+    if bytes_val < 1024:
+        return f"{bytes_val:.1f} B"
+    divisor, unit = size_unit(bytes_val)
+    return f"{bytes_val / divisor:.1f} {unit}"
+
+def get_file_size(file_path, metadata=None):
+    """Get file size in bytes and formatted string"""
+    try:
+        if metadata and isinstance(metadata.get("size"), int):
+            size_bytes = metadata["size"]
+        else:
+            size_bytes = os.stat(file_path).st_size
+        
+        return size_bytes, format_file_size(size_bytes)
+    except:
+        return 0, "0 bytes"
+
+def sanitize_filename(filename):
+    """Sanitize filename for use as ID and title"""
+    # Remove extension and convert to lowercase, with plain string
+    # operations since this runs once per item
+    name = os.path.splitext(os.path.basename(os.fspath(filename)))[0].lower()
+    # Replace spaces and special chars with underscores
+    name = NON_ALNUM_PATTERN.sub('_', name)
+    # Remove multiple underscores
+    name = MULTI_UNDERSCORE_PATTERN.sub('_', name)
+    # Remove leading/trailing underscores
+    name = name.strip('_')
+    return name
+
+def load_gallery_config(config_path):
+    """Load existing gallery config"""
+    try:
+        return parse_json(Path(config_path).read_bytes())
+    except FileNotFoundError:
+        # Create new config if it doesn't exist
+        return {
+            "version": "1.0.0",
+            "lastUpdated": datetime.now(timezone.utc).isoformat(),
+            "baseURL": "https://raw.githubusercontent.com/CodingMogul/livephotos-gallery/master",
+            "categories": []
+        }
+
+def save_gallery_config(config, config_path, now_iso=None):
+    """Save gallery config with proper formatting"""
+    config_path = Path(config_path)
+    config["lastUpdated"] = now_iso or datetime.now(timezone.utc).isoformat()
+    
+    # Write to a temp file and swap it in so readers never see a torn config
+    tmp_path = config_path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        if orjson:
+            f.write(orjson.dumps(config, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            f.write(json.dumps(config, indent=2, ensure_ascii=False).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, config_path)
+
+def atomic_json_update(config_path, updater, now_iso=None):
+    """Apply updater to the gallery config while holding an exclusive lock
+    
+    updater is called as updater(config, dirty) and adds the id of every
+    category it changes to the dirty set; the file is only rewritten when
+    that set is non-empty.
+    """
+    config_path = Path(config_path)
+    
+    # Concurrent importer runs serialize here, so each one re-reads the
+    # config after the previous run has saved its additions
+    with open(config_path.with_suffix('.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            config = load_gallery_config(config_path)
+            dirty = set()
+            result = updater(config, dirty)
+            
+            # Re-importing the same files is common; leave the file alone then
+            if dirty:
+                save_gallery_config(config, config_path, now_iso)
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def find_or_create_category(config, category_name):
+    """Find existing category or create new one"""
+    # Look for existing category with this name
+    for category in config["categories"]:
+        if category["id"] == category_name:
+            return category
+    
+    # Create new category
+    new_category = {
+        "id": category_name,
+        "name": category_name.title(),
+        "description": f"Beautiful {category_name} scenes",
+        "items": []
+    }
+    
+    config["categories"].append(new_category)
+    return new_category
+
+def update_gallery_config(config_path, category_name, entries, now_iso=None):
+    """Add or update many gallery items with a single config read and write
+    
+    Entries replace existing items with the same id and are otherwise
+    appended in order. Returns the items as stored in the config.
+    """
+    def merge_items(config, dirty):
+        """Merge the entries into the category, on this thread only"""
+        category_count = len(config["categories"])
+        category = find_or_create_category(config, category_name)
+        if len(config["categories"]) != category_count:
+            dirty.add(category_name)
+        
+        processed_items = []
+        
+        # Index existing items by ID so each lookup is a single hash
+        items_by_id = {existing["id"]: i for i, existing in enumerate(category["items"])}
+        
+        for item in entries:
+            existing_item = items_by_id.get(item["id"])
+            
+            if existing_item is not None:
+                existing = category["items"][existing_item]
+                if {**existing, "createdAt": item["createdAt"]} == item:
+                    # Same files as last time, keep the original timestamp
+                    print(f"   ⚠️  Gallery item unchanged: {item['id']}")
+                    processed_items.append(existing)
+                    continue
+                
+                # Update existing item
+                category["items"][existing_item] = item
+                dirty.add(category_name)
+                print(f"   ✅ Updated existing gallery item: {item['id']}")
+            else:
+                # Add new item, keeping the index in sync with the list
+                items_by_id[item["id"]] = len(category["items"])
+                category["items"].append(item)
+                dirty.add(category_name)
+                print(f"   ✅ Added new gallery item: {item['id']}")
+            
+            processed_items.append(item)
+        
+        return processed_items
+    
+    return atomic_json_update(config_path, merge_items, now_iso)
@@ -14,42 +14,33 @@ Usage:
     python3 batch_heic_importer.py /path/to/single/folder --nature --scenic --premium
 
 Requirements:
+    - exiftool (brew install exiftool) for batched metadata probing
     - ffmpeg (brew install ffmpeg) for video analysis
+    - orjson (pip install orjson), optional, for faster config reads/writes
 """
 
+import os
 import sys
-import json
-import shutil
+import fnmatch
+from glob import glob
 import argparse
-import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime, timezone
-import re
 
-def check_dependencies():
-    """Check if required tools are installed"""
-    tools = ['ffmpeg']
-    missing = []
-    
-    for tool in tools:
-        try:
-            result = subprocess.run([tool, '-version'], capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                missing.append(tool)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            missing.append(tool)
-    
-    if missing:
-        print(f"❌ Missing required tools: {', '.join(missing)}")
-        print("\nTo install missing tools:")
-        for tool in missing:
-            print(f"   brew install {tool}")
-        return False
-    
-    return True
+from batch_heic_common import (
+    batch_probe,
+    check_dependencies,
+    get_file_size,
+    get_video_duration,
+    is_same_file,
+    link_or_copy,
+    positive_int,
+    sanitize_filename,
+    update_gallery_config,
+)
 
-def copy_video_file(mov_path, output_name, videos_dir):
+def copy_video_file(mov_path, output_name, videos_dir, log=print):
     """Copy MOV video file to videos directory"""
     mov_path = Path(mov_path)
     videos_dir = Path(videos_dir)
@@ -57,91 +48,49 @@ def copy_video_file(mov_path, output_name, videos_dir):
     
     mov_output = videos_dir / f"{output_name}.mov"
     
-    print(f"   🎬 Copying video file {mov_path.name}...")
+    log(f"   🎬 Copying video file {mov_path.name}...")
     
     try:
-        if not mov_path.exists():
-            print(f"   ❌ Video file not found: {mov_path}")
+        try:
+            mov_stat = os.stat(mov_path)
+        except FileNotFoundError:
+            log(f"   ❌ Video file not found: {mov_path}")
             return None
+        
+        if is_same_file(mov_path, mov_output, mov_stat):
+            log(f"   ⚠️  Video already up to date: {mov_output.name}")
+            return mov_output
             
-        shutil.copy2(mov_path, mov_output)
+        link_or_copy(mov_path, mov_output)
         
-        if mov_output.exists() and mov_output.stat().st_size > 0:
-            print(f"   ✅ Successfully copied video: {mov_output.name}")
+        # A single stat covers both "exists" and "non-empty"
+        if os.stat(mov_output).st_size > 0:
+            log(f"   ✅ Successfully copied video: {mov_output.name}")
             return mov_output
         else:
-            print(f"   ❌ Failed to copy video file")
+            log(f"   ❌ Failed to copy video file")
             return None
             
     except Exception as e:
-        print(f"   ❌ Error copying video file {mov_path.name}: {e}")
+        log(f"   ❌ Error copying video file {mov_path.name}: {e}")
         return None
 
-def get_video_duration(video_path):
-    """Get video duration in seconds"""
-    try:
-        result = subprocess.run([
-            'ffprobe', '-v', 'quiet',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            str(video_path)
-        ], capture_output=True, text=True, check=True)
-        
-        duration_str = result.stdout.strip()
-        if duration_str and duration_str != 'N/A':
-            return float(duration_str)
-        return 1.0  # Default for static images
-    except:
-        return 1.0
-
-def get_file_size(file_path):
-    """Get file size in bytes and formatted string"""
-    try:
-        size_bytes = Path(file_path).stat().st_size
-        
-        # Format size
-        for unit in ['bytes', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                if unit == 'bytes':
-                    formatted = f"{int(size_bytes)} {unit}"
-                else:
-                    formatted = f"{size_bytes:.1f} {unit}"
-                break
-            size_bytes /= 1024.0
-        else:
-            formatted = f"{size_bytes:.1f} TB"
-        
-        return Path(file_path).stat().st_size, formatted
-    except:
-        return 0, "0 bytes"
-
-def sanitize_filename(filename):
-    """Sanitize filename for use as ID and title"""
-    # Remove extension and convert to lowercase
-    name = Path(filename).stem.lower()
-    # Replace spaces and special chars with underscores
-    name = re.sub(r'[^a-z0-9_]', '_', name)
-    # Remove multiple underscores
-    name = re.sub(r'_+', '_', name)
-    # Remove leading/trailing underscores
-    name = name.strip('_')
-    return name
-
-def create_gallery_item(heic_path, video_path, tags, gallery_root, folder_name):
+def create_gallery_item(heic_path, video_path, tags, gallery_root, folder_name,
+                        image_metadata=None, video_metadata=None, now_iso=None, is_premium=None):
     """Create a gallery item dict for the config"""
-    heic_path = Path(heic_path)
-    gallery_root = Path(gallery_root)
+    if not isinstance(heic_path, Path):
+        heic_path = Path(heic_path)
     
     # Generate ID and title from folder name
     base_name = sanitize_filename(folder_name)
     title = folder_name.replace('_', ' ').title()
     
     # Get file sizes and duration
-    image_size_bytes, image_size_formatted = get_file_size(heic_path)
+    image_size_bytes, image_size_formatted = get_file_size(heic_path, image_metadata)
     
     # Determine duration
-    if video_path and video_path.exists():
-        duration = get_video_duration(video_path)
+    if video_path:  # copy_video_file only returns paths it has just checked
+        duration = get_video_duration(video_path, video_metadata)
         video_url = f"videos/{video_path.name}"
     else:
         duration = 1.0
@@ -155,58 +104,89 @@ def create_gallery_item(heic_path, video_path, tags, gallery_root, folder_name):
         "imageURL": f"images/{heic_path.name}",
         "videoURL": video_url,
         "thumbnailURL": f"images/{heic_path.name}",
-        "isPremium": "premium" in tags,
+        "isPremium": is_premium if is_premium is not None else "premium" in tags,
         "tags": tags,
         "duration": round(duration, 1),
         "size": {
             "bytes": image_size_bytes,
             "formatted": image_size_formatted
         },
-        "createdAt": datetime.now(timezone.utc).isoformat()
+        "createdAt": now_iso or datetime.now(timezone.utc).isoformat()
     }
     
     return item
 
-def load_gallery_config(config_path):
-    """Load existing gallery config"""
+def find_live_photo_pair(folder_path):
+    """Find the HEIC and MOV pair inside an intake folder"""
+    folder = Path(folder_path)
+    
+    # Find HEIC and MOV files in a single directory pass
+    heic_files = []
+    mov_files = []
     try:
-        with open(config_path, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Create new config if it doesn't exist
-        return {
-            "version": "1.0.0",
-            "lastUpdated": datetime.now(timezone.utc).isoformat(),
-            "baseURL": "https://raw.githubusercontent.com/CodingMogul/livephotos-gallery/master",
-            "categories": []
-        }
-
-def save_gallery_config(config, config_path):
-    """Save gallery config with proper formatting"""
-    config["lastUpdated"] = datetime.now(timezone.utc).isoformat()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                extension = entry.name.rpartition('.')[2].lower()
+                if extension in ('heic', 'heif'):
+                    heic_files.append(entry.name)
+                elif extension == 'mov':
+                    mov_files.append(entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        print(f"❌ Folder not found or not a directory: {folder_path}")
+        return None
+    
+    if not heic_files:
+        print(f"❌ No HEIC files found in {folder.name}")
+        return None
+        
+    if not mov_files:
+        print(f"❌ No MOV files found in {folder.name}")
+        return None
     
-    with open(config_path, 'w') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    # Use the first HEIC and MOV files found (assumes one pair per folder)
+    return folder / min(heic_files), folder / min(mov_files)
 
-def find_or_create_category(config, category_name):
-    """Find existing category or create new one"""
-    # Look for existing category with this name
-    for category in config["categories"]:
-        if category["id"] == category_name:
-            return category
-    
-    # Create new category
-    new_category = {
-        "id": category_name,
-        "name": category_name.title(),
-        "description": f"Beautiful {category_name} scenes",
-        "items": []
-    }
+def process_intake_folder(folder, heic_file, mov_file, output_name, copy_image, metadata,
+                          tags, is_premium, gallery_root, images_dir, videos_dir, now_iso):
+    """Copy one paired HEIC/MOV folder into the gallery and build its item
+    
+    The image is only linked or copied when copy_image is set, i.e. when
+    this folder is the one that owns images/<name>. Returns the item
+    together with the folder's progress messages, which the caller writes
+    out in one go.
+    """
+    messages = []
+    log = messages.append
+    
+    log(f"\n📁 Processing folder: {folder.name}...")
+    log(f"   📸 Found HEIC: {heic_file.name}")
+    log(f"   🎬 Found MOV: {mov_file.name}")
+    
+    # Copy HEIC to images directory
+    dest_heic = images_dir / heic_file.name
+    if copy_image:
+        link_or_copy(heic_file, dest_heic)
+        log(f"   ✅ Copied image: {dest_heic.name}")
+    else:
+        log(f"   ⚠️  Image already exists: {dest_heic.name}")
+    
+    # Copy MOV to videos directory
+    video_path = copy_video_file(mov_file, output_name, videos_dir, log)
+    
+    # Create gallery item, reusing the metadata probed from the source files.
+    # The probed image size only describes images/<name> if this run put it
+    # there; otherwise the size is read from the file that is actually served
+    item = create_gallery_item(
+        dest_heic, video_path, tags, gallery_root, folder.name,
+        image_metadata=metadata.get(str(heic_file)) if copy_image else None,
+        video_metadata=metadata.get(str(mov_file)),
+        now_iso=now_iso,
+        is_premium=is_premium
+    )
     
-    config["categories"].append(new_category)
-    return new_category
+    return item, messages
 
-def process_intake_folders(folder_paths, tags, gallery_root):
+def process_intake_folders(folder_paths, tags, gallery_root, max_workers=None):
     """Process multiple folders containing paired HEIC and MOV files"""
     gallery_root = Path(gallery_root)
     images_dir = gallery_root / "images"
@@ -217,87 +197,131 @@ def process_intake_folders(folder_paths, tags, gallery_root):
     images_dir.mkdir(parents=True, exist_ok=True)
     videos_dir.mkdir(parents=True, exist_ok=True)
     
-    # Load existing config
-    config = load_gallery_config(config_path)
+    # Tags are the same for every item, so settle them once per batch
+    tags = list(tags)
+    is_premium = "premium" in frozenset(tags)
     
-    # Determine category name from first tag, or use 'custom' as default
-    category_name = tags[0] if tags else "custom"
-    category = find_or_create_category(config, category_name)
+    # One timestamp for the whole batch, shared by every item and the config
+    batch_now_iso = datetime.now(timezone.utc).isoformat()
     
-    processed_items = []
+    # Folders are independent and the work is dominated by blocking copies
+    # and subprocess calls, so run them on a thread pool
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
     
+    pairs = []
     for folder_path in folder_paths:
-        folder = Path(folder_path)
-        
-        if not folder.exists() or not folder.is_dir():
-            print(f"❌ Folder not found or not a directory: {folder_path}")
+        pair = find_live_photo_pair(folder_path)
+        if pair:
+            pairs.append((Path(folder_path), *pair))
+    
+    # One directory read up front instead of an exists() check per folder
+    with os.scandir(images_dir) as entries:
+        existing_images = frozenset(entry.name for entry in entries)
+    
+    # Decide which folder owns each destination before any thread starts, so
+    # every file in images/ and videos/ is written at most once. This keeps
+    # the outcome of processing folders one by one: the last folder with a
+    # gallery ID wins (it used to overwrite the video and the config item),
+    # while the first folder with an image name wins (later ones found the
+    # image already there)
+    last_folder_by_id = {}
+    for folder, _, _ in pairs:
+        # Generate output name based on folder name
+        last_folder_by_id[sanitize_filename(folder.name)] = folder
+    
+    jobs = []
+    image_owners = {}
+    for folder, heic_file, mov_file in pairs:
+        output_name = sanitize_filename(folder.name)
+        if last_folder_by_id[output_name] is not folder:
+            print(f"⚠️  Skipping folder {folder}: gallery ID {output_name} is taken over by {last_folder_by_id[output_name]}")
             continue
         
-        print(f"\n📁 Processing folder: {folder.name}...")
-        
-        # Find HEIC and MOV files in the folder
-        heic_files = list(folder.glob("*.HEIC")) + list(folder.glob("*.heic"))
-        mov_files = list(folder.glob("*.MOV")) + list(folder.glob("*.mov"))
+        owner = image_owners.setdefault(heic_file.name, folder)
+        if owner is not folder:
+            print(f"⚠️  Folder {folder}: image {heic_file.name} is also in {owner}, keeping that copy")
         
-        if not heic_files:
-            print(f"   ❌ No HEIC files found in {folder.name}")
-            continue
+        copy_image = owner is folder and heic_file.name not in existing_images
+        jobs.append((folder, heic_file, mov_file, output_name, copy_image))
+    
+    # Probe every source file with a single exiftool run instead of one
+    # ffprobe per video
+    metadata = batch_probe([path for _, heic_file, mov_file, _, _ in jobs for path in (heic_file, mov_file)])
+    
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                process_intake_folder, *job, metadata,
+                tags, is_premium, gallery_root, images_dir, videos_dir,
+                batch_now_iso
+            ): index
+            for index, job in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            item, messages = future.result()
+            results[futures[future]] = item
             
-        if not mov_files:
-            print(f"   ❌ No MOV files found in {folder.name}")
+            # One write per folder keeps concurrent folders from interleaving
+            # and avoids a flush for every progress line
+            sys.stdout.write("\n".join(messages) + "\n")
+            sys.stdout.flush()
+    
+    # Determine category name from first tag, or use 'custom' as default
+    category_name = tags[0] if tags else "custom"
+    
+    # Load, merge and save the config as one locked step
+    processed_items = update_gallery_config(
+        config_path, category_name, [item for item in results if item is not None], batch_now_iso
+    )
+    
+    return processed_items, config_path
+
+def expand_folder_patterns(patterns):
+    """Expand wildcard folder arguments into a sorted list without duplicates"""
+    folders = set()
+    
+    for pattern in patterns:
+        if '*' not in pattern and '?' not in pattern:
+            # Single folder
+            folders.add(pattern)
             continue
         
-        # Use the first HEIC and MOV files found (assumes one pair per folder)
-        heic_file = heic_files[0]
-        mov_file = mov_files[0]
-        
-        print(f"   📸 Found HEIC: {heic_file.name}")
-        print(f"   🎬 Found MOV: {mov_file.name}")
-        
-        # Generate output name based on folder name
-        output_name = sanitize_filename(folder.name)
-        
-        # Copy HEIC to images directory
-        dest_heic = images_dir / heic_file.name
-        if not dest_heic.exists():
-            shutil.copy2(heic_file, dest_heic)
-            print(f"   ✅ Copied image: {dest_heic.name}")
-        else:
-            print(f"   ⚠️  Image already exists: {dest_heic.name}")
-        
-        # Copy MOV to videos directory
-        video_path = copy_video_file(mov_file, output_name, videos_dir)
+        if '**' in pattern.split('/'):
+            # '**' as a whole path component recurses. glob skips hidden
+            # folders like the branch below; its match for the root itself
+            # comes back with a trailing slash and is left out
+            folders.update(path for path in glob(pattern, recursive=True) if not path.endswith('/'))
+            continue
         
-        # Create gallery item
-        item = create_gallery_item(dest_heic, video_path, tags, gallery_root, folder.name)
+        parent, name_pattern = os.path.split(pattern)
+        if '*' in parent or '?' in parent:
+            # Wildcards in the middle of the path, let glob walk it
+            folders.update(glob(pattern))
+            continue
         
-        # Check if item already exists (by ID)
-        existing_item = None
-        for i, existing in enumerate(category["items"]):
-            if existing["id"] == item["id"]:
-                existing_item = i
-                break
+        # Wildcard in the last component only: one directory read, matched by name
+        try:
+            with os.scandir(parent or '.') as entries:
+                names = [entry.name for entry in entries if entry.is_dir()]
+        except OSError:
+            continue
         
-        if existing_item is not None:
-            # Update existing item
-            category["items"][existing_item] = item
-            print(f"   ✅ Updated existing gallery item: {item['id']}")
-        else:
-            # Add new item
-            category["items"].append(item)
-            print(f"   ✅ Added new gallery item: {item['id']}")
+        # Like glob, only match hidden folders when the pattern asks for them
+        if not name_pattern.startswith('.'):
+            names = [name for name in names if not name.startswith('.')]
         
-        processed_items.append(item)
+        folders.update(os.path.join(parent, name) for name in fnmatch.filter(names, name_pattern))
     
-    # Save updated config
-    save_gallery_config(config, config_path)
-    
-    return processed_items, config_path
+    return sorted(folders)
 
-def main():
+def main(argv=None, prog=None):
     parser = argparse.ArgumentParser(
+        prog=prog,
         description="Batch process folders containing paired HEIC and MOV files for gallery import",
         formatter_class=argparse.RawDescriptionHelpFormatter,
+        fromfile_prefix_chars="@",
         epilog="""
 Examples:
   # Process multiple folders with tags
@@ -308,14 +332,19 @@ Examples:
   
   # Process folders in specific directory
   python3 batch_heic_importer.py /path/to/intake/* --scenic
+  
+  # Read folder paths (one per line) from a file
+  python3 batch_heic_importer.py @folders.txt --nature
         """
     )
     
     parser.add_argument("folders", nargs="+", help="Folders containing paired HEIC and MOV files (supports wildcards)")
     parser.add_argument("--gallery-root", default=".", help="Gallery root directory (default: current directory)")
+    parser.add_argument("--jobs", type=positive_int, default=None,
+                        help="Number of folders to process in parallel (default: 4 per CPU, up to 32)")
     
     # Parse remaining arguments as tags
-    args, unknown_args = parser.parse_known_args()
+    args, unknown_args = parser.parse_known_args(argv)
     
     # Extract tags from remaining arguments (anything starting with --)
     tags = []
@@ -340,19 +369,10 @@ Examples:
         sys.exit(1)
     
     # Expand folder patterns and filter existing folders
-    intake_folders = []
-    for pattern in args.folders:
-        if '*' in pattern or '?' in pattern:
-            # Glob pattern
-            from glob import glob
-            matches = glob(pattern)
-            intake_folders.extend(matches)
-        else:
-            # Single folder
-            intake_folders.append(pattern)
+    intake_folders = expand_folder_patterns(args.folders)
     
     # Filter to existing folders
-    existing_folders = [f for f in intake_folders if Path(f).exists() and Path(f).is_dir()]
+    existing_folders = [f for f in intake_folders if os.path.isdir(f)]
     
     if not existing_folders:
         print("❌ No folders found!")
@@ -362,7 +382,7 @@ Examples:
     
     # Process folders
     try:
-        processed_items, config_path = process_intake_folders(existing_folders, tags, args.gallery_root)
+        processed_items, config_path = process_intake_folders(existing_folders, tags, args.gallery_root, args.jobs)
         
         print(f"\n✅ Successfully processed {len(processed_items)} items!")
         print(f"📄 Updated gallery config: {config_path}")
@@ -8,54 +8,36 @@ Live Photo video without malformation or cropping issues.
 
 Usage:
     python3 extract_heic_video.py input.HEIC output_name [--output-dir ./videos]
+    python3 extract_heic_video.py photos/*.HEIC [--output-dir ./videos] [--jobs 4]
 
 Requirements:
     - exiftool (brew install exiftool)
     - ffmpeg (brew install ffmpeg)
+    - av (pip install av), optional, for probing streams without ffprobe
 
 This will create:
     - output_name.mov (the properly extracted Live Photo video)
+
+When several inputs are given, each video is named after its sanitized
+input filename. They are spread over --jobs worker processes (default:
+one per CPU), each running its own exiftool process; with --jobs 1 they
+are extracted one after another through a single exiftool process.
 """
 
+import io
 import os
 import sys
 import subprocess
 import argparse
-import tempfile
-import shutil
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import redirect_stdout
 from pathlib import Path
 
-def check_dependencies():
-    """Check if required tools are installed"""
-    tools = ['exiftool', 'ffmpeg']
-    missing = []
-    
-    for tool in tools:
-        try:
-            # Try to run the tool with a simple command
-            if tool == 'exiftool':
-                result = subprocess.run([tool, '-ver'], capture_output=True, text=True)
-            else:  # ffmpeg
-                result = subprocess.run([tool, '-version'], capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                missing.append(tool)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            missing.append(tool)
-    
-    if missing:
-        print(f"❌ Missing required tools: {', '.join(missing)}")
-        print("\nTo install missing tools:")
-        for tool in missing:
-            if tool == 'exiftool':
-                print(f"   brew install exiftool")
-            elif tool == 'ffmpeg':
-                print(f"   brew install ffmpeg")
-        return False
-    
-    return True
+from _exiftool import ExifToolSession
+from batch_heic_common import av, check_dependencies, format_bytes, is_heic_file, positive_int, sanitize_filename
 
-def extract_live_photo_video(input_path, output_name, output_dir="./videos"):
+def extract_live_photo_video(input_path, output_name, output_dir="./videos", exiftool=None):
     """Extract the Live Photo video component using exiftool method"""
     
     input_path = Path(input_path)
@@ -69,168 +51,227 @@ def extract_live_photo_video(input_path, output_name, output_dir="./videos"):
         print(f"❌ Error: Input file must be a HEIC/HEIF file, got {input_path.suffix}")
         return False
     
+    # Reject mislabelled files from their header rather than after a round
+    # of failed exiftool and ffmpeg runs
+    if not is_heic_file(input_path):
+        print(f"❌ Error: {input_path.name} is not a HEIC/HEIF image")
+        return False
+    
+    if exiftool is None:
+        # Both exiftool methods share one process instead of spawning twice
+        with ExifToolSession() as exiftool:
+            return extract_live_photo_video(input_path, output_name, output_dir, exiftool)
+    
     # Create output directory
     output_dir.mkdir(parents=True, exist_ok=True)
     
     # Output file path
     mov_output = output_dir / f"{output_name}.mov"
     
+    # Every method writes to a sibling .part file that only replaces
+    # mov_output once it holds a video, so a failed or interrupted run never
+    # clobbers a good .mov from an earlier one
+    part_output = mov_output.with_name(mov_output.name + '.part')
+    
     print(f"🎬 Extracting Live Photo video from {input_path.name}...")
     print(f"   Input: {input_path}")
     print(f"   Output: {mov_output}")
     
-    # Create a temporary directory for intermediate files
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
+    try:
+        # Method 1: Try to extract using exiftool (most reliable for Live Photos)
+        print("   Method 1: Using exiftool to extract embedded video...")
         
-        try:
-            # Method 1: Try to extract using exiftool (most reliable for Live Photos)
-            print("   Method 1: Using exiftool to extract embedded video...")
-            
-            # Extract the embedded video using exiftool
-            temp_video = temp_path / "extracted_video.mov"
-            
-            result = subprocess.run([
-                'exiftool', 
-                '-b',  # Binary output
-                '-EmbeddedVideoFile',  # Extract embedded video
-                str(input_path)
-            ], capture_output=True)
-            
-            if result.returncode == 0 and result.stdout:
-                # Write the extracted video data to file
-                with open(temp_video, 'wb') as f:
-                    f.write(result.stdout)
-                
-                if temp_video.exists() and temp_video.stat().st_size > 0:
-                    print("   ✅ Successfully extracted video using exiftool")
-                    
-                    # Copy to final destination
-                    shutil.copy2(temp_video, mov_output)
-                    return verify_video_output(mov_output)
-                else:
-                    print("   ❌ Exiftool extraction failed - no video data")
-            else:
-                print("   ❌ Exiftool extraction failed - no embedded video found")
-            
-            # Method 2: Try alternative exiftool tag
-            print("   Method 2: Trying alternative exiftool extraction...")
-            
-            result = subprocess.run([
-                'exiftool', 
-                '-b',
-                '-EmbeddedVideo',
-                str(input_path)
-            ], capture_output=True)
-            
-            if result.returncode == 0 and result.stdout:
-                with open(temp_video, 'wb') as f:
-                    f.write(result.stdout)
-                
-                if temp_video.exists() and temp_video.stat().st_size > 0:
-                    print("   ✅ Successfully extracted video using alternative exiftool method")
-                    shutil.copy2(temp_video, mov_output)
-                    return verify_video_output(mov_output)
-            
-            # Method 3: Try to extract using ffmpeg with specific Live Photo handling
-            print("   Method 3: Using ffmpeg with Live Photo specific extraction...")
+        # Stream the embedded video straight to disk, with no in-memory
+        # buffer or intermediate copy
+        with open(part_output, 'wb') as f:
+            exiftool.extract_binary(input_path, 'EmbeddedVideoFile', output=f)
+        
+        if part_output.stat().st_size > 0:
+            os.replace(part_output, mov_output)
+            print("   ✅ Successfully extracted video using exiftool")
+            return verify_video_output(mov_output, exiftool)
+        else:
+            print("   ❌ Exiftool extraction failed - no embedded video found")
+        
+        # Without an EmbeddedVideoFile the ffmpeg methods are likely to be
+        # needed, so probe the streams in the background while exiftool
+        # tries the other tag
+        probe_executor = ThreadPoolExecutor(max_workers=1)
+        streams_future = probe_executor.submit(probe_video_streams, input_path)
+        probe_executor.shutdown(wait=False)
+        
+        # Method 2: Try alternative exiftool tag
+        print("   Method 2: Trying alternative exiftool extraction...")
+        
+        with open(part_output, 'wb') as f:
+            exiftool.extract_binary(input_path, 'EmbeddedVideo', output=f)
+        
+        if part_output.stat().st_size > 0:
+            os.replace(part_output, mov_output)
+            print("   ✅ Successfully extracted video using alternative exiftool method")
+            return verify_video_output(mov_output, exiftool)
+        
+        # Method 3: Try to extract using ffmpeg with specific Live Photo handling
+        print("   Method 3: Using ffmpeg with Live Photo specific extraction...")
+        
+        # First, analyze the file structure
+        streams = streams_future.result()
+        
+        if streams is not None:
+            print(f"   Found {len(streams)} video streams:")
+            for i, stream in enumerate(streams):
+                print(f"     Stream {stream['index']}: {stream['codec']} {stream['width']}x{stream['height']} ({stream['duration']}s)")
             
-            # First, analyze the file structure
-            probe_result = subprocess.run([
-                'ffprobe', '-v', 'quiet',
-                '-show_entries', 'stream=index,codec_type,codec_name,width,height,duration,bit_rate',
-                '-of', 'csv=p=0',
-                str(input_path)
-            ], capture_output=True, text=True)
+            # Look for the video stream that's most likely the Live Photo video
+            # Usually it's the one with h264 codec and reasonable duration
+            video_stream = None
+            for stream in streams:
+                if (stream['codec'] in ['h264', 'hevc'] and 
+                    stream['duration'] > 0.5 and 
+                    stream['width'] > 0 and 
+                    stream['height'] > 0):
+                    video_stream = stream
+                    break
             
-            if probe_result.returncode == 0:
-                streams = []
-                for line in probe_result.stdout.strip().split('\n'):
-                    if line and 'video' in line:
-                        parts = line.split(',')
-                        if len(parts) >= 6:
-                            streams.append({
-                                'index': int(parts[0]),
-                                'codec': parts[2],
-                                'width': int(parts[3]) if parts[3] != 'N/A' else 0,
-                                'height': int(parts[4]) if parts[4] != 'N/A' else 0,
-                                'duration': float(parts[5]) if parts[5] != 'N/A' else 0,
-                                'bitrate': parts[6] if len(parts) > 6 else 'N/A'
-                            })
-                
-                print(f"   Found {len(streams)} video streams:")
-                for i, stream in enumerate(streams):
-                    print(f"     Stream {stream['index']}: {stream['codec']} {stream['width']}x{stream['height']} ({stream['duration']}s)")
+            if video_stream:
+                print(f"   Extracting stream {video_stream['index']} ({video_stream['codec']})")
                 
-                # Look for the video stream that's most likely the Live Photo video
-                # Usually it's the one with h264 codec and reasonable duration
-                video_stream = None
-                for stream in streams:
-                    if (stream['codec'] in ['h264', 'hevc'] and 
-                        stream['duration'] > 0.5 and 
-                        stream['width'] > 0 and 
-                        stream['height'] > 0):
-                        video_stream = stream
-                        break
-                
-                if video_stream:
-                    print(f"   Extracting stream {video_stream['index']} ({video_stream['codec']})")
-                    
-                    subprocess.run([
-                        'ffmpeg', '-i', str(input_path),
-                        '-map', f"0:{video_stream['index']}",
-                        '-c', 'copy',  # Copy without re-encoding
-                        '-avoid_negative_ts', 'make_zero',
-                        '-y',
-                        str(mov_output)
-                    ], check=True, capture_output=True)
-                    
-                    if mov_output.exists() and mov_output.stat().st_size > 0:
-                        print(f"   ✅ Successfully extracted video using ffmpeg stream mapping")
-                        return verify_video_output(mov_output)
-            
-            # Method 4: Last resort - try to extract the video track differently
-            print("   Method 4: Attempting direct video track extraction...")
-            
-            try:
                 subprocess.run([
-                    'ffmpeg', '-i', str(input_path),
-                    '-vcodec', 'copy',
-                    '-an',  # No audio
+                    'ffmpeg',
+                    '-hide_banner', '-nostdin',  # No banner, never wait on the terminal
+                    '-loglevel', 'error',
+                    '-i', str(input_path),
+                    '-map', f"0:{video_stream['index']}",
+                    '-c', 'copy',  # Copy without re-encoding
                     '-avoid_negative_ts', 'make_zero',
+                    '-f', 'mov',  # The .part name doesn't tell ffmpeg the format
                     '-y',
-                    str(mov_output)
+                    str(part_output)
                 ], check=True, capture_output=True)
                 
-                if mov_output.exists() and mov_output.stat().st_size > 0:
-                    print("   ✅ Successfully extracted video using direct extraction")
-                    return verify_video_output(mov_output)
-                    
-            except subprocess.CalledProcessError:
-                pass
-            
-            print("❌ All extraction methods failed")
-            return False
+                if part_output.exists() and part_output.stat().st_size > 0:
+                    os.replace(part_output, mov_output)
+                    print(f"   ✅ Successfully extracted video using ffmpeg stream mapping")
+                    return verify_video_output(mov_output, exiftool)
+        
+        # Method 4: Last resort - try to extract the video track differently
+        print("   Method 4: Attempting direct video track extraction...")
+        
+        try:
+            subprocess.run([
+                'ffmpeg',
+                '-hide_banner', '-nostdin',
+                '-loglevel', 'error',
+                '-i', str(input_path),
+                '-vcodec', 'copy',
+                '-an',  # No audio
+                '-avoid_negative_ts', 'make_zero',
+                '-f', 'mov',
+                '-y',
+                str(part_output)
+            ], check=True, capture_output=True)
             
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Error during extraction: {e}")
-            return False
-        except Exception as e:
-            print(f"❌ Unexpected error: {e}")
-            return False
+            if part_output.exists() and part_output.stat().st_size > 0:
+                os.replace(part_output, mov_output)
+                print("   ✅ Successfully extracted video using direct extraction")
+                return verify_video_output(mov_output, exiftool)
+                
+        except subprocess.CalledProcessError:
+            pass
+        
+        print("❌ All extraction methods failed")
+        return False
+        
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Error during extraction: {e}")
+        return False
+    except Exception as e:
+        print(f"❌ Unexpected error: {e}")
+        return False
+    finally:
+        # Whatever went wrong, don't leave a partial file behind
+        try:
+            part_output.unlink()
+        except FileNotFoundError:
+            pass
+
+def probe_video_streams(input_path):
+    """List the video streams in a file, or return None if it can't be probed"""
+    if av is not None:
+        # Read the container in-process instead of starting ffprobe
+        try:
+            with av.open(str(input_path)) as container:
+                return [{
+                    'index': stream.index,
+                    'codec': stream.codec_context.name,
+                    'width': stream.codec_context.width or 0,
+                    'height': stream.codec_context.height or 0,
+                    'duration': float(stream.duration * stream.time_base) if stream.duration else 0,
+                    'bitrate': stream.codec_context.bit_rate or 'N/A'
+                } for stream in container.streams.video]
+        except Exception:
+            return None
+    
+    probe_result = subprocess.run([
+        'ffprobe', '-v', 'quiet',
+        '-show_entries', 'stream=index,codec_type,codec_name,width,height,duration,bit_rate',
+        '-of', 'csv=p=0',
+        str(input_path)
+    ], capture_output=True, text=True)
+    
+    if probe_result.returncode != 0:
+        return None
+    
+    streams = []
+    for line in probe_result.stdout.strip().split('\n'):
+        if line and 'video' in line:
+            parts = line.split(',')
+            if len(parts) >= 6:
+                streams.append({
+                    'index': int(parts[0]),
+                    'codec': parts[2],
+                    'width': int(parts[3]) if parts[3] != 'N/A' else 0,
+                    'height': int(parts[4]) if parts[4] != 'N/A' else 0,
+                    'duration': float(parts[5]) if parts[5] != 'N/A' else 0,
+                    'bitrate': parts[6] if len(parts) > 6 else 'N/A'
+                })
+    return streams
 
-def verify_video_output(video_path):
+def verify_video_output(video_path, exiftool=None):
     """Verify that the extracted video is valid and get its properties"""
     try:
-        result = subprocess.run([
-            'ffprobe', '-v', 'quiet',
-            '-show_entries', 'format=duration,size,bit_rate',
-            '-show_entries', 'stream=width,height,codec_name,r_frame_rate',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            str(video_path)
-        ], capture_output=True, text=True, check=True)
-        
-        lines = [line.strip() for line in result.stdout.strip().split('\n') if line.strip()]
+        if exiftool is not None:
+            # Ask the already running exiftool rather than starting ffprobe
+            entries = exiftool.get_metadata(
+                [video_path],
+                'ImageWidth', 'ImageHeight', 'CompressorID', 'VideoFrameRate', 'Duration'
+            )
+            info = entries[0] if entries else {}
+            keys = ['ImageWidth', 'ImageHeight', 'CompressorID', 'VideoFrameRate']
+            lines = [str(info[key]) for key in keys] if all(key in info for key in keys) else []
+            if lines and 'Duration' in info:
+                lines.append(str(info['Duration']))
+        elif av is not None:
+            with av.open(str(video_path)) as container:
+                stream = container.streams.video[0]
+                lines = [
+                    str(stream.codec_context.width),
+                    str(stream.codec_context.height),
+                    stream.codec_context.name,
+                    str(stream.average_rate)
+                ]
+                if container.duration:
+                    lines.append(str(container.duration / av.time_base))
+        else:
+            result = subprocess.run([
+                'ffprobe', '-v', 'quiet',
+                '-show_entries', 'format=duration,size,bit_rate',
+                '-show_entries', 'stream=width,height,codec_name,r_frame_rate',
+                '-of', 'default=noprint_wrappers=1:nokey=1',
+                str(video_path)
+            ], capture_output=True, text=True, check=True)
+            
+            lines = [line.strip() for line in result.stdout.strip().split('\n') if line.strip()]
         
         if len(lines) >= 4:
             width = lines[0]
@@ -269,21 +310,98 @@ def verify_video_output(video_path):
         print(f"   ⚠️  Warning: Error during verification: {e}")
         return True
 
-def format_bytes(bytes_val):
-    """Format bytes into human readable string"""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if bytes_val < 1024.0:
-            return f"{bytes_val:.1f} {unit}"
-        bytes_val /= 1024.0
-    return f"{bytes_val:.1f} TB"
+# Each pool worker process keeps its own exiftool session
+worker_exiftool = None
+
+def extract_in_worker(input_path, output_name, output_dir):
+    """Run one extraction in a pool worker, capturing its progress output"""
+    global worker_exiftool
+    if worker_exiftool is None:
+        worker_exiftool = ExifToolSession().start()
+        # Worker processes skip atexit, but multiprocessing runs its finalizers
+        multiprocessing.util.Finalize(worker_exiftool, worker_exiftool.close, exitpriority=10)
+    elif not worker_exiftool.is_running():
+        # A failed command killed the session; don't hand the dead one on
+        worker_exiftool.start()
+    
+    output = io.StringIO()
+    with redirect_stdout(output):
+        success = extract_live_photo_video(input_path, output_name, output_dir, worker_exiftool)
+    return success, output.getvalue()
 
-def main():
-    parser = argparse.ArgumentParser(description="Extract MOV video from HEIC Live Photos")
-    parser.add_argument("input", help="Path to HEIC Live Photo file")
-    parser.add_argument("output_name", help="Output name (without extension)")
+def batch_extract(paths, output_dir="./videos", output_names=None, jobs=1):
+    """Extract the Live Photo videos of many HEIC files
+    
+    With jobs > 1 the files are spread over that many worker processes,
+    each driving its own exiftool process; otherwise they share a single
+    exiftool process. Returns a dict mapping each input path to whether
+    its extraction succeeded.
+    """
+    if output_names is None:
+        output_names = [sanitize_filename(path) for path in paths]
+    
+    results = {}
+    
+    # Inputs that map to the same output name would overwrite each other's
+    # video, or write it at the same time under --jobs, so only the first
+    # one gets to use the name
+    pending = []
+    owners = {}
+    for path, output_name in zip(paths, output_names):
+        if output_name in owners:
+            print(f"❌ Skipping {path}: {output_name}.mov is already the output for {owners[output_name]}")
+            results[path] = False
+            continue
+        owners[output_name] = path
+        pending.append((path, output_name))
+    
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as executor:
+            futures = {
+                executor.submit(extract_in_worker, path, output_name, output_dir): path
+                for path, output_name in pending
+            }
+            for future in as_completed(futures):
+                success, output = future.result()
+                results[futures[future]] = success
+                
+                # Print each file's progress as one block so workers don't interleave
+                sys.stdout.write(output + "\n")
+                sys.stdout.flush()
+        
+        # Report in the order the files were given
+        return {path: results[path] for path in paths}
+    
+    with ExifToolSession() as exiftool:
+        for path, output_name in pending:
+            # A failed command kills the session; start a fresh one for the next file
+            if not exiftool.is_running():
+                exiftool.start()
+            results[path] = extract_live_photo_video(path, output_name, output_dir, exiftool)
+            print()
+    
+    return {path: results[path] for path in paths}
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Extract MOV video from HEIC Live Photos",
+        fromfile_prefix_chars="@"
+    )
+    parser.add_argument("inputs", nargs="+", metavar="input",
+                        help="Path(s) to HEIC Live Photo files; a single input may be followed by an output name")
     parser.add_argument("-o", "--output-dir", default="./videos", help="Output directory (default: ./videos)")
+    parser.add_argument("-j", "--jobs", type=positive_int, default=os.cpu_count() or 1,
+                        help="Number of files to extract in parallel (default: CPU count; use 1 on spinning disks)")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    
+    # Keep the original "input output_name" form working; otherwise every
+    # argument is an input named after its sanitized filename
+    inputs = args.inputs
+    output_names = None
+    if len(inputs) == 2 and Path(inputs[1]).suffix.upper() not in ['.HEIC', '.HEIF']:
+        inputs, output_names = inputs[:1], inputs[1:]
     
     print("🎬 HEIC Live Photo Video Extractor v2.0")
     print("=" * 50)
@@ -292,7 +410,14 @@ def main():
     if not check_dependencies():
         sys.exit(1)
     
-    success = extract_live_photo_video(args.input, args.output_name, args.output_dir)
+    results = batch_extract(inputs, args.output_dir, output_names, args.jobs)
+    success = all(results.values())
+    
+    if len(results) > 1:
+        print(f"📊 Extracted {sum(results.values())} of {len(results)} Live Photo videos")
+        for path, extracted in results.items():
+            if not extracted:
+                print(f"   ❌ {path}")
     
     if success:
         print("\n✅ Live Photo video extraction completed successfully!")
@@ -310,4 +435,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()